@@ -0,0 +1,32 @@
+"""
+Optional Numba kernels for stroke prediction analysis.
+
+Only imported by data_processing for frames large enough to repay Numba's
+import and cache-load cost; requires numba.
+"""
+
+import numba
+import numpy as np
+
+
+@numba.njit(parallel=True, cache=True)
+def _group_sums_counts(codes, stroke, n_groups, n_chunks):
+    # Each chunk fills its own row of partial results so the parallel loop
+    # never writes the same slot from two threads
+    chunk = (len(codes) + n_chunks - 1) // n_chunks
+    sums = np.zeros((n_chunks, n_groups), np.int64)
+    counts = np.zeros((n_chunks, n_groups), np.int64)
+    for t in numba.prange(n_chunks):
+        for i in range(t * chunk, min((t + 1) * chunk, len(codes))):
+            c = codes[i]
+            if c >= 0:
+                counts[t, c] += 1
+                sums[t, c] += stroke[i]
+    return sums.sum(axis=0), counts.sum(axis=0)
+
+
+def group_sums_counts(codes, stroke, n_groups):
+    """Per-group stroke sums and row counts; codes of -1 are skipped."""
+    # The thread count is passed in rather than read inside the kernel, which
+    # would keep Numba from caching the compiled function
+    return _group_sums_counts(codes, stroke, n_groups, numba.get_num_threads())
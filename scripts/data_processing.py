@@ -2,18 +2,101 @@
 Data processing for stroke prediction analysis.
 """
 
+import hashlib
+import inspect
+import os
+import tempfile
+
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from pathlib import Path
 
 
-def load_stroke_data(filepath=None):
-    """Load the stroke dataset."""
+CATEGORICAL_COLUMNS = ['gender', 'ever_married', 'work_type', 'Residence_type', 'smoking_status']
+
+# Column dtypes applied while parsing the CSV; bmi is left to clean_stroke_data
+# because the raw file marks missing values as 'N/A'
+CSV_DTYPES = {
+    **{column: 'category' for column in CATEGORICAL_COLUMNS},
+    'age': 'float32',
+    'hypertension': 'int8',
+    'heart_disease': 'int8',
+    'avg_glucose_level': 'float32',
+    'stroke': 'int8',
+}
+
+
+DEFAULT_DATA_PATH = Path(__file__).parent.parent / "data" / "healthcare-dataset-stroke-data.csv"
+CACHE_DIR = Path(__file__).parent.parent / "data" / "cache"
+
+# Cache keys already hash the source of the code that builds each stage (see
+# _stage_source); bump this only to force a rebuild that the source does not capture
+CACHE_VERSION = 1
+
+
+def _stage_source(stage):
+    """Source of the functions whose output is cached for a stage."""
+    functions = [load_stroke_data] if stage == 'raw' else [load_stroke_data, clean_stroke_data]
+    return ''.join(inspect.getsource(function) for function in functions)
+
+
+def _cache_path(filepath, stage):
+    """Parquet cache file for a CSV, keyed on its path, mtime and size plus the parsing schema
+    and the source of the code that produces the stage.
+    
+    Returns None for inputs that are not existing files (buffers, URLs, ...),
+    which are passed straight to read_csv uncached.
+    """
+    if not isinstance(filepath, (str, Path)) or not Path(filepath).is_file():
+        return None
+    filepath = Path(filepath)
+    stat = filepath.stat()
+    key = hashlib.sha1(str((
+        str(filepath.resolve()), stat.st_mtime_ns, stat.st_size,
+        CACHE_VERSION, sorted(CSV_DTYPES.items()), _stage_source(stage),
+    )).encode()).hexdigest()
+    return CACHE_DIR / f"{stage}_{key}.parquet"
+
+
+def _read_cache(cache_path):
+    """Read a cached frame, or None if it is missing or unreadable (then rebuilt)."""
+    if cache_path is None or not cache_path.exists():
+        return None
+    try:
+        return pd.read_parquet(cache_path)
+    except Exception as e:
+        print(f"Ignoring unreadable cache {cache_path.name}: {e}")
+        return None
+
+
+def _write_cache(df, cache_path):
+    # Write to a temporary file and rename it into place, so an interrupted or
+    # concurrent run never leaves a truncated file under the final name
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=f".{cache_path.stem}_", suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_stroke_data(filepath=None, use_cache=True):
+    """Load the stroke dataset, reusing the Parquet cache if the CSV is unchanged."""
     if filepath is None:
-        project_root = Path(__file__).parent.parent
-        filepath = project_root / "data" / "healthcare-dataset-stroke-data.csv"
+        filepath = DEFAULT_DATA_PATH
+    
+    cache_path = _cache_path(filepath, 'raw') if use_cache else None
+    df = _read_cache(cache_path)
+    if df is None:
+        df = pd.read_csv(filepath, engine='pyarrow', dtype=CSV_DTYPES)
+        if cache_path is not None:
+            _write_cache(df, cache_path)
     
-    df = pd.read_csv(filepath)
     print(f"Loaded stroke data: {len(df)} rows, {len(df.columns)} columns")
     return df
 
@@ -22,63 +105,80 @@ def clean_stroke_data(df):
     """Clean and preprocess the stroke data."""
     df_clean = df.copy()
     
-    # Handle BMI missing values (marked as 'N/A')
-    df_clean['bmi'] = pd.to_numeric(df_clean['bmi'], errors='coerce')
-    
-    # Fill missing BMI with median
-    bmi_median = df_clean['bmi'].median()
-    df_clean['bmi'] = df_clean['bmi'].fillna(bmi_median)
+    # Handle BMI missing values (marked as 'N/A'), then fill them with the
+    # median in place on a single float32 buffer
+    bmi = pd.to_numeric(df_clean['bmi'], errors='coerce').to_numpy(dtype=np.float32, copy=True)
+    missing = np.isnan(bmi)
+    bmi[missing] = np.median(bmi[~missing])
+    df_clean['bmi'] = bmi
     
     # Remove 'Other' gender (only 1 record)
     df_clean = df_clean[df_clean['gender'] != 'Other']
     
+    # Low-cardinality strings: store as category so groupby hashes int codes
+    # (a no-op for frames from load_stroke_data, which parses them as category)
+    df_clean = df_clean.astype({column: 'category' for column in CATEGORICAL_COLUMNS})
+    df_clean['gender'] = df_clean['gender'].cat.remove_unused_categories()
+    
     print(f"Cleaned data: {len(df_clean)} rows")
     return df_clean
 
 
-def get_age_groups(df):
-    """Create age groups for analysis."""
-    df_copy = df.copy()
+def load_clean_stroke_data(filepath=None, use_cache=True):
+    """Load and clean the stroke dataset, reusing the cleaned Parquet cache if the CSV is unchanged."""
+    if filepath is None:
+        filepath = DEFAULT_DATA_PATH
+    
+    cache_path = _cache_path(filepath, 'clean') if use_cache else None
+    df_clean = _read_cache(cache_path)
+    if df_clean is not None:
+        print(f"Loaded cleaned stroke data from cache: {len(df_clean)} rows")
+        return df_clean
     
+    df_clean = clean_stroke_data(load_stroke_data(filepath, use_cache=use_cache))
+    if cache_path is not None:
+        _write_cache(df_clean, cache_path)
+    return df_clean
+
+
+def _bin_age(age):
     bins = [0, 18, 30, 45, 60, 75, 100]
     labels = ['0-18', '19-30', '31-45', '46-60', '61-75', '75+']
     
-    df_copy['age_group'] = pd.cut(df_copy['age'], bins=bins, labels=labels, include_lowest=True)
-    return df_copy
+    return pd.cut(age, bins=bins, labels=labels, include_lowest=True)
+
+
+def _bin_by_thresholds(values, thresholds, labels):
+    """Bin a numeric Series at the given thresholds (lower bound inclusive)."""
+    # side='right' sends a value equal to a threshold to the upper bin, matching
+    # '<' comparisons; NaN sorts past every threshold and lands in the last bin
+    codes = np.searchsorted(np.asarray(thresholds), values.to_numpy(), side='right')
+    # Ordered like pd.cut's age groups, so the bins sort and compare low-to-high
+    return pd.Series(pd.Categorical.from_codes(codes, categories=labels, ordered=True),
+                     index=values.index, name=values.name)
+
+
+def _bin_bmi(bmi):
+    return _bin_by_thresholds(bmi, [18.5, 25, 30], ['Underweight', 'Normal', 'Overweight', 'Obese'])
+
+
+def _bin_glucose(glucose):
+    return _bin_by_thresholds(glucose, [100, 126], ['Normal', 'Pre-diabetic', 'Diabetic'])
+
+
+def get_age_groups(df):
+    """Return df with an 'age_group' column added."""
+    return df.assign(age_group=_bin_age(df['age']))
 
 
 def get_bmi_category(df):
-    """Create BMI categories."""
-    df_copy = df.copy()
-    
-    def categorize_bmi(bmi):
-        if bmi < 18.5:
-            return 'Underweight'
-        elif bmi < 25:
-            return 'Normal'
-        elif bmi < 30:
-            return 'Overweight'
-        else:
-            return 'Obese'
-    
-    df_copy['bmi_category'] = df_copy['bmi'].apply(categorize_bmi)
-    return df_copy
+    """Return df with a 'bmi_category' column added."""
+    return df.assign(bmi_category=_bin_bmi(df['bmi']))
 
 
 def get_glucose_category(df):
-    """Create glucose level categories."""
-    df_copy = df.copy()
-    
-    def categorize_glucose(glucose):
-        if glucose < 100:
-            return 'Normal'
-        elif glucose < 126:
-            return 'Pre-diabetic'
-        else:
-            return 'Diabetic'
-    
-    df_copy['glucose_category'] = df_copy['avg_glucose_level'].apply(categorize_glucose)
-    return df_copy
+    """Return df with a 'glucose_category' column added."""
+    return df.assign(glucose_category=_bin_glucose(df['avg_glucose_level']))
 
 
 def get_stroke_stats(df):
@@ -97,38 +197,117 @@ def get_stroke_stats(df):
 
 def get_stats_by_column(df, column):
     """Get stroke statistics grouped by a column."""
-    grouped = df.groupby(column).agg({
-        'stroke': ['sum', 'count']
-    }).reset_index()
-    
-    grouped.columns = [column, 'stroke_count', 'total_count']
-    grouped['no_stroke_count'] = grouped['total_count'] - grouped['stroke_count']
-    grouped['stroke_rate'] = round(grouped['stroke_count'] / grouped['total_count'] * 100, 2)
-    
-    return grouped
+    codes, uniques = pd.factorize(df[column], sort=True)
+    return _stats_from_codes(column, codes, uniques, df['stroke'].to_numpy())
 
 
-def get_risk_factor_summary(df):
-    """Summarize stroke rates by risk factors."""
-    summary = {}
-    
-    # Hypertension
-    hypertension_stats = get_stats_by_column(df, 'hypertension')
-    summary['hypertension'] = hypertension_stats
-    
-    # Heart disease
-    heart_stats = get_stats_by_column(df, 'heart_disease')
-    summary['heart_disease'] = heart_stats
+# Row count from which the optional Numba kernel is used for summaries. Below
+# it, np.bincount finishes before Numba could even be imported and its cached
+# kernel loaded (~0.4s per process), so numba is never touched.
+NUMBA_MIN_ROWS = 2_000_000
+
+
+def _load_numba_kernel():
+    """Return the Numba summary kernel, or None if numba is not installed."""
+    try:
+        from ._numba_kernels import group_sums_counts
+    except ImportError:
+        try:  # Run as a script from inside scripts/
+            from _numba_kernels import group_sums_counts
+        except ImportError:
+            return None
+    return group_sums_counts
+
+
+def _group_sums_counts(codes, stroke, n_groups):
+    """Per-group stroke sums and row counts; codes of -1 are skipped."""
+    if len(codes) >= NUMBA_MIN_ROWS:
+        kernel = _load_numba_kernel()
+        if kernel is not None:
+            return kernel(codes, stroke, n_groups)
+    
+    valid = codes >= 0  # factorize marks missing keys with -1; groupby drops them
+    codes = codes[valid]
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, weights=stroke[valid], minlength=n_groups).astype(np.int64)
+    return sums, counts
+
+
+def _stats_from_codes(column, codes, uniques, stroke):
+    """Build a get_stats_by_column-style frame from factorized group codes."""
+    stroke_count, total_count = _group_sums_counts(codes, stroke, len(uniques))
+    
+    return pd.DataFrame({
+        column: uniques,
+        'stroke_count': stroke_count,
+        'total_count': total_count,
+        'no_stroke_count': total_count - stroke_count,
+        'stroke_rate': np.round(stroke_count / total_count * 100, 2),
+    })
+
+
+def get_stats_by_columns(df, columns, summaries=None):
+    """Get stroke statistics for several grouping columns in a single pass.
+    
+    Returns a dict mapping each column to the same frame get_stats_by_column
+    would produce. If a summaries dict is passed, columns already in it are
+    reused and new ones are added to it; it must only be shared between calls
+    on the same data.
+    """
+    if summaries is None:
+        summaries = {}
+    
+    stroke = None
+    for column in columns:
+        if column in summaries:
+            continue
+        if stroke is None:
+            stroke = df['stroke'].to_numpy()
+        codes, uniques = pd.factorize(df[column], sort=True)
+        summaries[column] = _stats_from_codes(column, codes, uniques, stroke)
+    
+    return {column: summaries[column] for column in columns}
+
+
+def get_risk_factor_summary(df, summaries=None):
+    """Summarize stroke rates by risk factors.
     
-    # Smoking
-    smoking_stats = get_stats_by_column(df, 'smoking_status')
-    summary['smoking'] = smoking_stats
+    Pass the same summaries dict to export_for_tableau to reuse these results.
+    """
+    stats = get_stats_by_columns(df, ['hypertension', 'heart_disease', 'smoking_status'], summaries)
     
-    return summary
+    return {
+        'hypertension': stats['hypertension'],
+        'heart_disease': stats['heart_disease'],
+        'smoking': stats['smoking_status'],
+    }
+
 
+def _write_csv(df, path):
+    """Write df to CSV with Arrow's multi-threaded columnar writer."""
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path)
 
-def export_for_tableau(df, output_dir=None):
-    """Export processed data for Tableau visualization."""
+
+# (column, filename) for each summary CSV written by export_for_tableau
+TABLEAU_SUMMARIES = [
+    ('age_group', 'age_group_tableau.csv'),
+    ('gender', 'gender_tableau.csv'),
+    ('hypertension', 'hypertension_tableau.csv'),
+    ('heart_disease', 'heart_disease_tableau.csv'),
+    ('smoking_status', 'smoking_tableau.csv'),
+    ('work_type', 'work_type_tableau.csv'),
+    ('Residence_type', 'residence_tableau.csv'),
+    ('bmi_category', 'bmi_category_tableau.csv'),
+    ('glucose_category', 'glucose_category_tableau.csv'),
+]
+
+
+def export_for_tableau(df, output_dir=None, summaries=None):
+    """Export processed data for Tableau visualization.
+    
+    summaries is an optional dict of get_stats_by_columns results for df (e.g.
+    shared with get_risk_factor_summary); columns already in it are not recomputed.
+    """
     if output_dir is None:
         output_dir = Path(__file__).parent.parent / "tableau"
     else:
@@ -136,56 +315,26 @@ def export_for_tableau(df, output_dir=None):
     
     output_dir.mkdir(exist_ok=True)
     
-    # Add categories
-    df_export = get_age_groups(df)
-    df_export = get_bmi_category(df_export)
-    df_export = get_glucose_category(df_export)
+    # Add categories (single assign so the frame is copied once, not per column)
+    df_export = df.assign(
+        age_group=_bin_age(df['age']),
+        bmi_category=_bin_bmi(df['bmi']),
+        glucose_category=_bin_glucose(df['avg_glucose_level']),
+    )
     
     # Main data export
-    df_export.to_csv(output_dir / "stroke_data_tableau.csv", index=False)
-    
-    # Age group summary
-    age_summary = get_stats_by_column(df_export, 'age_group')
-    age_summary.to_csv(output_dir / "age_group_tableau.csv", index=False)
-    
-    # Gender summary
-    gender_summary = get_stats_by_column(df, 'gender')
-    gender_summary.to_csv(output_dir / "gender_tableau.csv", index=False)
-    
-    # Hypertension summary
-    hyper_summary = get_stats_by_column(df, 'hypertension')
-    hyper_summary.to_csv(output_dir / "hypertension_tableau.csv", index=False)
-    
-    # Heart disease summary
-    heart_summary = get_stats_by_column(df, 'heart_disease')
-    heart_summary.to_csv(output_dir / "heart_disease_tableau.csv", index=False)
-    
-    # Smoking summary
-    smoking_summary = get_stats_by_column(df, 'smoking_status')
-    smoking_summary.to_csv(output_dir / "smoking_tableau.csv", index=False)
-    
-    # Work type summary
-    work_summary = get_stats_by_column(df, 'work_type')
-    work_summary.to_csv(output_dir / "work_type_tableau.csv", index=False)
-    
-    # Residence summary
-    residence_summary = get_stats_by_column(df, 'Residence_type')
-    residence_summary.to_csv(output_dir / "residence_tableau.csv", index=False)
-    
-    # BMI category summary
-    bmi_summary = get_stats_by_column(df_export, 'bmi_category')
-    bmi_summary.to_csv(output_dir / "bmi_category_tableau.csv", index=False)
+    _write_csv(df_export, output_dir / "stroke_data_tableau.csv")
     
-    # Glucose category summary
-    glucose_summary = get_stats_by_column(df_export, 'glucose_category')
-    glucose_summary.to_csv(output_dir / "glucose_category_tableau.csv", index=False)
+    # Per-column summaries, computed in one pass over the stroke column
+    summaries = get_stats_by_columns(df_export, [column for column, _ in TABLEAU_SUMMARIES], summaries)
+    for column, filename in TABLEAU_SUMMARIES:
+        _write_csv(summaries[column], output_dir / filename)
     
-    print(f"Exported {10} files to {output_dir}")
+    print(f"Exported {len(TABLEAU_SUMMARIES) + 1} files to {output_dir}")
 
 
 if __name__ == "__main__":
-    df = load_stroke_data()
-    df_clean = clean_stroke_data(df)
+    df_clean = load_clean_stroke_data()
     
     stats = get_stroke_stats(df_clean)
     print(f"\nStroke Statistics: {stats}")
@@ -2,12 +2,24 @@
 Visualizations for stroke prediction analysis.
 """
 
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Render off-screen so worker processes never touch a GUI backend
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+try:
+    from .data_processing import get_stats_by_column, get_stats_by_columns
+except ImportError:  # Run as a script from inside scripts/
+    from data_processing import get_stats_by_column, get_stats_by_columns
+
 
 # Set style (compatible with different matplotlib versions)
 try:
@@ -33,14 +45,40 @@ def save_fig(fig, filename, output_dir=None):
     
     output_dir.mkdir(exist_ok=True)
     filepath = output_dir / filename
-    fig.savefig(filepath, dpi=300, bbox_inches='tight', facecolor='white')
+    # 150 dpi is plenty for dashboard PNGs; zlib level 1 encodes much faster
+    # than the default level 6 for a slightly larger file. Figures are laid out
+    # by their 'tight' layout engine at draw time, so write straight through the
+    # Agg canvas instead of savefig (no bbox_inches='tight' probe render).
+    fig.set_dpi(150)
+    fig.set_facecolor('white')
+    fig.canvas.print_png(str(filepath), pil_kwargs={'compress_level': 1})
     print(f"Saved: {filepath}")
     plt.close(fig)
 
 
-def plot_stroke_distribution(df):
+def _summary(df, column, summaries):
+    """Prebuilt stroke summary for column (computed from df if not provided), with an unrounded stroke_rate."""
+    if summaries is not None and column in summaries:
+        stats = summaries[column]
+    else:
+        stats = get_stats_by_column(df, column)
+    
+    # The summary's stroke_rate is rounded to 2 dp for export; plot and label
+    # the exact rate so '.1f'/'.2f' labels are not rounded twice
+    return stats.assign(stroke_rate=stats['stroke_count'] / stats['total_count'] * 100)
+
+
+def _new_figure(fig, figsize):
+    """Return (figure, standalone): a new figure to save, or the dashboard panel passed in."""
+    if fig is None:
+        return plt.figure(figsize=figsize, layout='tight'), True
+    return fig, False
+
+
+def plot_stroke_distribution(df, fig=None):
     """Plot stroke case distribution."""
-    fig, ax = plt.subplots(figsize=(8, 6))
+    fig, standalone = _new_figure(fig, figsize=(8, 6))
+    ax = fig.subplots()
     
     stroke_counts = df['stroke'].value_counts()
     labels = ['No Stroke', 'Stroke']
@@ -56,33 +94,45 @@ def plot_stroke_distribution(df):
     ax.set_ylabel('Number of Patients', fontsize=12)
     ax.set_xlabel('Stroke Status', fontsize=12)
     
-    save_fig(fig, '01_stroke_distribution.png')
+    if standalone:
+        save_fig(fig, '01_stroke_distribution.png')
 
 
-def plot_age_distribution(df):
+def plot_age_distribution(df, fig=None):
     """Plot age distribution by stroke status."""
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig, standalone = _new_figure(fig, figsize=(10, 6))
+    ax = fig.subplots()
+    
+    # Mask the raw arrays rather than the frame, so only the age values are copied
+    age = df['age'].to_numpy()
+    stroke = df['stroke'].to_numpy()
+    stroke_no = age[stroke == 0]
+    stroke_yes = age[stroke == 1]
     
-    stroke_no = df[df['stroke'] == 0]['age']
-    stroke_yes = df[df['stroke'] == 1]['age']
+    # Bin once with NumPy and draw each histogram as a single filled step
+    # artist instead of one Rectangle patch per bin
+    edges = np.histogram_bin_edges(age, bins=30)
+    counts_no, _ = np.histogram(stroke_no, bins=edges)
+    counts_yes, _ = np.histogram(stroke_yes, bins=edges)
     
-    ax.hist(stroke_no, bins=30, alpha=0.6, label='No Stroke', color='#2ecc71')
-    ax.hist(stroke_yes, bins=30, alpha=0.6, label='Stroke', color='#e74c3c')
+    ax.stairs(counts_no, edges, fill=True, alpha=0.6, label='No Stroke', color='#2ecc71')
+    ax.stairs(counts_yes, edges, fill=True, alpha=0.6, label='Stroke', color='#e74c3c')
     
     ax.set_title('Age Distribution by Stroke Status', fontsize=14, fontweight='bold')
     ax.set_xlabel('Age', fontsize=12)
     ax.set_ylabel('Number of Patients', fontsize=12)
     ax.legend()
     
-    save_fig(fig, '02_age_distribution.png')
+    if standalone:
+        save_fig(fig, '02_age_distribution.png')
 
 
-def plot_age_group_stroke_rate(df, age_column='age_group'):
+def plot_age_group_stroke_rate(df, age_column='age_group', summaries=None, fig=None):
     """Plot stroke rate by age group."""
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig, standalone = _new_figure(fig, figsize=(10, 6))
+    ax = fig.subplots()
     
-    age_stats = df.groupby(age_column)['stroke'].agg(['sum', 'count']).reset_index()
-    age_stats['stroke_rate'] = age_stats['sum'] / age_stats['count'] * 100
+    age_stats = _summary(df, age_column, summaries)
     
     bars = ax.bar(age_stats[age_column].astype(str), age_stats['stroke_rate'], 
                   color='#3498db', edgecolor='black')
@@ -95,22 +145,24 @@ def plot_age_group_stroke_rate(df, age_column='age_group'):
     ax.set_xlabel('Age Group', fontsize=12)
     ax.set_ylabel('Stroke Rate (%)', fontsize=12)
     
-    save_fig(fig, '03_age_group_stroke_rate.png')
+    if standalone:
+        save_fig(fig, '03_age_group_stroke_rate.png')
 
 
-def plot_gender_analysis(df):
+def plot_gender_analysis(df, summaries=None, fig=None):
     """Plot stroke analysis by gender."""
-    fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+    fig, standalone = _new_figure(fig, figsize=(14, 5))
+    axes = fig.subplots(1, 2)
+    
+    gender_stroke = _summary(df, 'gender', summaries)
     
     # Gender distribution
-    gender_counts = df['gender'].value_counts()
-    axes[0].pie(gender_counts, labels=gender_counts.index, autopct='%1.1f%%',
+    gender_counts = gender_stroke.sort_values('total_count', ascending=False)
+    axes[0].pie(gender_counts['total_count'], labels=gender_counts['gender'], autopct='%1.1f%%',
                 colors=['#3498db', '#e74c3c'], startangle=90)
     axes[0].set_title('Gender Distribution', fontsize=12, fontweight='bold')
     
     # Stroke rate by gender
-    gender_stroke = df.groupby('gender')['stroke'].agg(['sum', 'count']).reset_index()
-    gender_stroke['stroke_rate'] = gender_stroke['sum'] / gender_stroke['count'] * 100
     
     bars = axes[1].bar(gender_stroke['gender'], gender_stroke['stroke_rate'],
                        color=['#3498db', '#e74c3c'], edgecolor='black')
@@ -123,17 +175,17 @@ def plot_gender_analysis(df):
     axes[1].set_xlabel('Gender', fontsize=11)
     axes[1].set_ylabel('Stroke Rate (%)', fontsize=11)
     
-    plt.tight_layout()
-    save_fig(fig, '04_gender_analysis.png')
+    if standalone:
+        save_fig(fig, '04_gender_analysis.png')
 
 
-def plot_medical_conditions(df):
+def plot_medical_conditions(df, summaries=None, fig=None):
     """Plot stroke rate by medical conditions."""
-    fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+    fig, standalone = _new_figure(fig, figsize=(14, 5))
+    axes = fig.subplots(1, 2)
     
     # Hypertension
-    hyper_stats = df.groupby('hypertension')['stroke'].agg(['sum', 'count']).reset_index()
-    hyper_stats['stroke_rate'] = hyper_stats['sum'] / hyper_stats['count'] * 100
+    hyper_stats = _summary(df, 'hypertension', summaries)
     
     labels = ['No Hypertension', 'Hypertension']
     bars1 = axes[0].bar(labels, hyper_stats['stroke_rate'], color=['#2ecc71', '#e74c3c'], edgecolor='black')
@@ -146,8 +198,7 @@ def plot_medical_conditions(df):
     axes[0].set_ylabel('Stroke Rate (%)', fontsize=11)
     
     # Heart Disease
-    heart_stats = df.groupby('heart_disease')['stroke'].agg(['sum', 'count']).reset_index()
-    heart_stats['stroke_rate'] = heart_stats['sum'] / heart_stats['count'] * 100
+    heart_stats = _summary(df, 'heart_disease', summaries)
     
     labels = ['No Heart Disease', 'Heart Disease']
     bars2 = axes[1].bar(labels, heart_stats['stroke_rate'], color=['#2ecc71', '#e74c3c'], edgecolor='black')
@@ -159,16 +210,16 @@ def plot_medical_conditions(df):
     axes[1].set_title('Stroke Rate by Heart Disease Status', fontsize=12, fontweight='bold')
     axes[1].set_ylabel('Stroke Rate (%)', fontsize=11)
     
-    plt.tight_layout()
-    save_fig(fig, '05_medical_conditions.png')
+    if standalone:
+        save_fig(fig, '05_medical_conditions.png')
 
 
-def plot_smoking_analysis(df):
+def plot_smoking_analysis(df, summaries=None, fig=None):
     """Plot stroke rate by smoking status."""
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig, standalone = _new_figure(fig, figsize=(10, 6))
+    ax = fig.subplots()
     
-    smoking_stats = df.groupby('smoking_status')['stroke'].agg(['sum', 'count']).reset_index()
-    smoking_stats['stroke_rate'] = smoking_stats['sum'] / smoking_stats['count'] * 100
+    smoking_stats = _summary(df, 'smoking_status', summaries)
     smoking_stats = smoking_stats.sort_values('stroke_rate', ascending=False)
     
     colors = ['#e74c3c', '#f39c12', '#3498db', '#95a5a6']
@@ -182,18 +233,18 @@ def plot_smoking_analysis(df):
     ax.set_xlabel('Stroke Rate (%)', fontsize=12)
     ax.set_ylabel('Smoking Status', fontsize=12)
     
-    save_fig(fig, '06_smoking_analysis.png')
+    if standalone:
+        save_fig(fig, '06_smoking_analysis.png')
 
 
-def plot_bmi_analysis(df, bmi_column='bmi_category'):
+def plot_bmi_analysis(df, bmi_column='bmi_category', summaries=None, fig=None):
     """Plot stroke rate by BMI category."""
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig, standalone = _new_figure(fig, figsize=(10, 6))
+    ax = fig.subplots()
     
     bmi_order = ['Underweight', 'Normal', 'Overweight', 'Obese']
-    df_bmi = df[df[bmi_column].isin(bmi_order)]
-    
-    bmi_stats = df_bmi.groupby(bmi_column)['stroke'].agg(['sum', 'count']).reset_index()
-    bmi_stats['stroke_rate'] = bmi_stats['sum'] / bmi_stats['count'] * 100
+    bmi_stats = _summary(df, bmi_column, summaries)
+    bmi_stats = bmi_stats[bmi_stats[bmi_column].isin(bmi_order)].copy()
     
     # Sort by BMI order
     bmi_stats[bmi_column] = pd.Categorical(bmi_stats[bmi_column], categories=bmi_order, ordered=True)
@@ -210,18 +261,18 @@ def plot_bmi_analysis(df, bmi_column='bmi_category'):
     ax.set_xlabel('BMI Category', fontsize=12)
     ax.set_ylabel('Stroke Rate (%)', fontsize=12)
     
-    save_fig(fig, '07_bmi_analysis.png')
+    if standalone:
+        save_fig(fig, '07_bmi_analysis.png')
 
 
-def plot_glucose_analysis(df, glucose_column='glucose_category'):
+def plot_glucose_analysis(df, glucose_column='glucose_category', summaries=None, fig=None):
     """Plot stroke rate by glucose category."""
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig, standalone = _new_figure(fig, figsize=(10, 6))
+    ax = fig.subplots()
     
     glucose_order = ['Normal', 'Pre-diabetic', 'Diabetic']
-    df_glucose = df[df[glucose_column].isin(glucose_order)]
-    
-    glucose_stats = df_glucose.groupby(glucose_column)['stroke'].agg(['sum', 'count']).reset_index()
-    glucose_stats['stroke_rate'] = glucose_stats['sum'] / glucose_stats['count'] * 100
+    glucose_stats = _summary(df, glucose_column, summaries)
+    glucose_stats = glucose_stats[glucose_stats[glucose_column].isin(glucose_order)].copy()
     
     # Sort by glucose order
     glucose_stats[glucose_column] = pd.Categorical(glucose_stats[glucose_column], categories=glucose_order, ordered=True)
@@ -238,15 +289,16 @@ def plot_glucose_analysis(df, glucose_column='glucose_category'):
     ax.set_xlabel('Glucose Category', fontsize=12)
     ax.set_ylabel('Stroke Rate (%)', fontsize=12)
     
-    save_fig(fig, '08_glucose_analysis.png')
+    if standalone:
+        save_fig(fig, '08_glucose_analysis.png')
 
 
-def plot_work_type_analysis(df):
+def plot_work_type_analysis(df, summaries=None, fig=None):
     """Plot stroke rate by work type."""
-    fig, ax = plt.subplots(figsize=(12, 6))
+    fig, standalone = _new_figure(fig, figsize=(12, 6))
+    ax = fig.subplots()
     
-    work_stats = df.groupby('work_type')['stroke'].agg(['sum', 'count']).reset_index()
-    work_stats['stroke_rate'] = work_stats['sum'] / work_stats['count'] * 100
+    work_stats = _summary(df, 'work_type', summaries)
     work_stats = work_stats.sort_values('stroke_rate', ascending=True)
     
     colors = sns.color_palette("RdYlGn_r", len(work_stats))
@@ -260,22 +312,24 @@ def plot_work_type_analysis(df):
     ax.set_xlabel('Stroke Rate (%)', fontsize=12)
     ax.set_ylabel('Work Type', fontsize=12)
     
-    save_fig(fig, '09_work_type_analysis.png')
+    if standalone:
+        save_fig(fig, '09_work_type_analysis.png')
 
 
-def plot_residence_analysis(df):
+def plot_residence_analysis(df, summaries=None, fig=None):
     """Plot stroke rate by residence type."""
-    fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+    fig, standalone = _new_figure(fig, figsize=(14, 5))
+    axes = fig.subplots(1, 2)
+    
+    residence_stroke = _summary(df, 'Residence_type', summaries)
     
     # Residence distribution
-    residence_counts = df['Residence_type'].value_counts()
-    axes[0].pie(residence_counts, labels=residence_counts.index, autopct='%1.1f%%',
+    residence_counts = residence_stroke.sort_values('total_count', ascending=False)
+    axes[0].pie(residence_counts['total_count'], labels=residence_counts['Residence_type'], autopct='%1.1f%%',
                 colors=['#3498db', '#2ecc71'], startangle=90)
     axes[0].set_title('Residence Type Distribution', fontsize=12, fontweight='bold')
     
     # Stroke rate by residence
-    residence_stroke = df.groupby('Residence_type')['stroke'].agg(['sum', 'count']).reset_index()
-    residence_stroke['stroke_rate'] = residence_stroke['sum'] / residence_stroke['count'] * 100
     
     bars = axes[1].bar(residence_stroke['Residence_type'], residence_stroke['stroke_rate'],
                        color=['#3498db', '#2ecc71'], edgecolor='black')
@@ -288,65 +342,131 @@ def plot_residence_analysis(df):
     axes[1].set_xlabel('Residence Type', fontsize=11)
     axes[1].set_ylabel('Stroke Rate (%)', fontsize=11)
     
-    plt.tight_layout()
-    save_fig(fig, '10_residence_analysis.png')
+    if standalone:
+        save_fig(fig, '10_residence_analysis.png')
 
 
-def plot_correlation_heatmap(df):
+def plot_correlation_heatmap(df, fig=None):
     """Plot correlation heatmap of numeric features."""
-    fig, ax = plt.subplots(figsize=(10, 8))
+    fig, standalone = _new_figure(fig, figsize=(10, 8))
+    ax = fig.subplots()
     
     # Select numeric columns
     numeric_cols = ['age', 'hypertension', 'heart_disease', 'avg_glucose_level', 'bmi', 'stroke']
-    df_numeric = df[numeric_cols].copy()
+    values = df[numeric_cols].to_numpy(dtype=np.float32)
     
-    # Calculate correlation
-    corr = df_numeric.corr()
+    # Calculate correlation in float32 (np.corrcoef upcasts to float64 unless told otherwise)
+    corr = np.corrcoef(values, rowvar=False, dtype=np.float32)
     
     # Plot heatmap
     sns.heatmap(corr, annot=True, cmap='RdYlBu_r', center=0,
-                fmt='.2f', linewidths=0.5, ax=ax)
+                fmt='.2f', linewidths=0.5, ax=ax,
+                xticklabels=numeric_cols, yticklabels=numeric_cols)
     
     ax.set_title('Correlation Heatmap of Features', fontsize=14, fontweight='bold')
     
-    save_fig(fig, '11_correlation_heatmap.png')
+    if standalone:
+        save_fig(fig, '11_correlation_heatmap.png')
 
 
-def create_all_visualizations(df):
-    """Generate all visualizations."""
-    print("Creating visualizations...")
-    
-    plot_stroke_distribution(df)
-    plot_age_distribution(df)
+# Plots that accept prebuilt summaries from get_stats_by_columns
+SUMMARY_PLOTS = {
+    plot_age_group_stroke_rate, plot_gender_analysis, plot_medical_conditions,
+    plot_smoking_analysis, plot_bmi_analysis, plot_glucose_analysis,
+    plot_work_type_analysis, plot_residence_analysis,
+}
+
+
+def _plot_plan(df):
+    """Plot functions applicable to df, plus the summaries they share."""
+    plots = [plot_stroke_distribution, plot_age_distribution]
     
     # Check if age_group column exists
     if 'age_group' in df.columns:
-        plot_age_group_stroke_rate(df)
+        plots.append(plot_age_group_stroke_rate)
     
-    plot_gender_analysis(df)
-    plot_medical_conditions(df)
-    plot_smoking_analysis(df)
+    plots += [plot_gender_analysis, plot_medical_conditions, plot_smoking_analysis]
     
     # Check if bmi_category column exists
     if 'bmi_category' in df.columns:
-        plot_bmi_analysis(df)
+        plots.append(plot_bmi_analysis)
     
     # Check if glucose_category column exists
     if 'glucose_category' in df.columns:
-        plot_glucose_analysis(df)
+        plots.append(plot_glucose_analysis)
+    
+    plots += [plot_work_type_analysis, plot_residence_analysis, plot_correlation_heatmap]
+    
+    # Summarize every grouping column once up front; the plots only render them
+    summary_columns = ['gender', 'hypertension', 'heart_disease', 'smoking_status',
+                       'work_type', 'Residence_type']
+    summary_columns += [column for column in ['age_group', 'bmi_category', 'glucose_category']
+                        if column in df.columns]
+    summaries = get_stats_by_columns(df, summary_columns)
+    
+    return plots, summaries
+
+
+def create_dashboard(df, filename='dashboard.png'):
+    """Render all visualizations as panels of a single 4x3 figure."""
+    plots, summaries = _plot_plan(df)
+    
+    # One canvas and one PNG encode instead of one per plot; sub-figures (not
+    # plain axes) because several plots draw two panels side by side
+    fig = plt.figure(figsize=(36, 24), layout='constrained')
+    for plot, panel in zip(plots, fig.subfigures(4, 3).flat):
+        if plot in SUMMARY_PLOTS:
+            plot(df, summaries=summaries, fig=panel)
+        else:
+            plot(df, fig=panel)
+    
+    save_fig(fig, filename)
+
+
+def create_all_visualizations(df, max_workers=None, dashboard=False):
+    """Generate all visualizations, rendering the figures in parallel processes.
+    
+    With dashboard=True, render them into a single dashboard PNG instead.
+    """
+    print("Creating visualizations...")
     
-    plot_work_type_analysis(df)
-    plot_residence_analysis(df)
-    plot_correlation_heatmap(df)
+    if dashboard:
+        create_dashboard(df)
+        print("Dashboard created!")
+        return
+    
+    plots, summaries = _plot_plan(df)
+    
+    kwargs = {plot: {'summaries': summaries} if plot in SUMMARY_PLOTS else {} for plot in plots}
+    workers = min(max_workers or os.cpu_count() or 1, len(plots))
+    
+    # A single worker gains nothing from a process pool, so render in-process
+    if workers == 1:
+        for plot in plots:
+            plot(df, **kwargs[plot])
+        print("All visualizations created!")
+        return
+    
+    # Each figure is independent and spends most of its time rasterizing and
+    # PNG-encoding, so render (and save) each one in its own worker process.
+    # Use the platform's default start method (fork on Linux: cheap, and no
+    # __main__ guard needed in the caller). The exception is when the Numba
+    # summary kernel has been loaded (frames of NUMBA_MIN_ROWS+ rows): forking
+    # after its thread pool started deadlocks the children, so spawn instead,
+    # at the cost of each worker re-importing pandas/matplotlib/seaborn.
+    context = multiprocessing.get_context('spawn' if 'numba' in sys.modules else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(plot, df, **kwargs[plot]) for plot in plots]
+        for future in futures:
+            future.result()  # Re-raise any error from the worker
     
     print("All visualizations created!")
 
 
 if __name__ == "__main__":
-    from data_processing import load_stroke_data, clean_stroke_data, get_age_groups, get_bmi_category, get_glucose_category
+    from data_processing import load_clean_stroke_data, get_age_groups, get_bmi_category, get_glucose_category
     
-    df = load_stroke_data()
-    df_clean = clean_stroke_data(df)
+    df_clean = load_clean_stroke_data()
     df_clean = get_age_groups(df_clean)
     df_clean = get_bmi_category(df_clean)
     df_clean = get_glucose_category(df_clean)